@@ -1,9 +1,286 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, abort, render_template, request, jsonify, stream_with_context, url_for
 import asyncio
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+from flask_compress import Compress
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from werkzeug.exceptions import HTTPException
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+try:
+    import uvloop
+except ImportError:  # Windows, or the optional dependency is not installed
+    uvloop = None
+
+from src.agent import CodeReviewAgent, SETTINGS_FINGERPRINT, SUPPORTED_EXTENSIONS
+from src.config import config
+from src.llm_cache import LLMCache, cache_key
+from src.semantic_cache import SemanticCache
+from src.tokens import count_tokens
+
+logging.basicConfig(
+    level=config.log_level.upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Serialize jsonify() responses with orjson instead of the stdlib encoder."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 
+# Behind a router/load balancer the peer address is the proxy's; take the client IP
+# from X-Forwarded-For so the rate limiter keys on real clients. Only trust as many
+# hops as are actually in front of the app, or clients could spoof their address.
+if config.trusted_proxy_count:
+    app.wsgi_app = ProxyFix(
+        app.wsgi_app, x_for=config.trusted_proxy_count, x_proto=config.trusted_proxy_count
+    )
+
+# Leave room for multipart boundaries and other form fields around the code itself
+MAX_REQUEST_BYTES = config.max_file_size_mb * 1024 * 1024 + 64 * 1024
+# Werkzeug refuses larger bodies before they are buffered or parsed
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Reviews are large, repetitive JSON/markdown; compress them. The event stream is
+# left out so gzip buffering does not hold back progressive results.
+app.config['COMPRESS_MIMETYPES'] = [
+    'application/json', 'text/markdown', 'text/html', 'text/css', 'application/javascript'
+]
+app.config['COMPRESS_MIN_SIZE'] = 1024
+Compress(app)
+
+# Static assets are versioned in the page URLs by content hash (static_url), so
+# browsers can keep them for a day instead of re-fetching CSS/JS on every visit
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 86400
+
+
+@lru_cache(maxsize=None)
+def _static_digest(path, mtime_ns):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+@app.template_global()
+def static_url(filename):
+    """URL of a static file with its content hash, so any edit busts browser caches."""
+    path = os.path.join(app.static_folder, filename)
+    return url_for('static', filename=filename, v=_static_digest(path, os.stat(path).st_mtime_ns))
+
+# Every review spends LLM tokens; cap how fast a single client can request them.
+# Use a shared storage (redis://) when running several Gunicorn workers.
+app.config['RATELIMIT_HEADERS_ENABLED'] = True
+limiter = Limiter(get_remote_address, app=app, storage_uri=config.rate_limit_storage_uri)
+
+# Exact-match cache of review results, keyed by code + extension + model + prompt version
+review_cache = LLMCache(max_entries=config.review_cache_max_entries)
+
+# Second tier: embedding-similarity lookup for near-duplicate code (opt-in)
+semantic_cache = (
+    SemanticCache(
+        config.semantic_cache_dir,
+        threshold=config.semantic_threshold,
+        max_entries=config.semantic_cache_max_entries
+    )
+    if config.semantic_cache_enabled else None
+)
+
+# One event loop per process, running in a daemon thread, so the agent's async
+# HTTP client keeps its connection pool across requests
+_LOOP = None
+_AGENT = None
+_loop_lock = threading.Lock()
+_agent_lock = threading.Lock()
+
+
+def _get_loop():
+    """Start the background event loop on first use (after any worker fork)."""
+    global _LOOP
+    with _loop_lock:
+        if _LOOP is None:
+            _LOOP = uvloop.new_event_loop() if uvloop else asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="review-loop", daemon=True).start()
+            atexit.register(_LOOP.call_soon_threadsafe, _LOOP.stop)
+    return _LOOP
+
+
+def get_agent():
+    """Return the process-wide CodeReviewAgent, creating it once even under threaded workers."""
+    global _AGENT
+    if _AGENT is None:
+        with _agent_lock:
+            if _AGENT is None:
+                _AGENT = CodeReviewAgent()
+    return _AGENT
+
+
+def run_review(code, file_extension):
+    """Run agent.review_code on the background loop and wait for the result."""
+    fut = asyncio.run_coroutine_threadsafe(get_agent().review_code(code, file_extension), _get_loop())
+    try:
+        return fut.result(timeout=config.review_timeout)
+    except FutureTimeoutError:
+        fut.cancel()
+        raise
+
+
+def stream_review(code, file_extension):
+    """Yield review events from agent.review_code_stream as they are produced."""
+    events = queue.Queue()
+    done = object()
+
+    async def _pump():
+        try:
+            async for event in get_agent().review_code_stream(code, file_extension):
+                events.put(event)
+        finally:
+            events.put(done)
+
+    fut = asyncio.run_coroutine_threadsafe(_pump(), _get_loop())
+    try:
+        while True:
+            event = events.get(timeout=config.review_timeout)
+            if event is done:
+                return
+            yield event
+    except queue.Empty:
+        yield {"event": "error", "error": f"Review timed out after {config.review_timeout} seconds"}
+    finally:
+        # Stop the review if the client went away or we timed out
+        fut.cancel()
+
+
+def _log_cache_lookup(hit):
+    logger.debug(
+        "review cache %s (size=%d, hits=%d, misses=%d)",
+        "hit" if hit else "miss", len(review_cache),
+        review_cache.stats["hits"], review_cache.stats["misses"]
+    )
+
+
+def _cache_scope(file_extension):
+    """Cached reviews are only valid for the same extension and review settings."""
+    return f"{file_extension}|{SETTINGS_FINGERPRINT}"
+
+
+def _review_payload(result):
+    """The public shape of a review, as returned by /analyze and stored in the caches
+    (without the reviewed code or internal workflow state)."""
+    return {k: result[k] for k in ('status', 'error', 'analysis_results', 'feedback') if k in result}
+
+
+def _store_review(key, scope, code, payload):
+    """Cache a review for replay; only complete reviews qualify.
+    "partial" means an analysis or the synthesis failed, which a retry may not repeat.
+    """
+    if payload.get('status') != 'success':
+        return
+    review_cache.set(key, payload, ttl=config.review_cache_ttl_seconds)
+    if semantic_cache is not None:
+        semantic_cache.put(code, scope, payload)
+
+
+def _sse(event):
+    return f"data: {app.json.dumps(event)}\n\n"
+
+def _reject_oversize_body():
+    """Abort with 413 based on Content-Length, before the body is read."""
+    if request.content_length is not None and request.content_length > MAX_REQUEST_BYTES:
+        abort(413)
+
+def _parse_payload():
+    """Return (code, file_extension) from a JSON or form body, reading it once.
+
+    The extension comes from `file_extension`, else from `file_name`, else defaults to py.
+    """
+    if request.mimetype == 'application/json':
+        raw = request.get_data(cache=False)
+        try:
+            fields = orjson.loads(raw) if raw else {}
+        except orjson.JSONDecodeError:
+            abort(400, description='Request body is not valid JSON')
+        if not isinstance(fields, dict):
+            abort(400, description='Request body must be a JSON object')
+    else:
+        fields = request.form
+
+    code = fields.get('code') or ''
+    if not isinstance(code, str):
+        abort(400, description='code must be a string')
+
+    ext = str(fields.get('file_extension') or '').strip().lstrip('.').lower()
+    if not ext:
+        file_name = str(fields.get('file_name') or '')
+        ext = file_name.rsplit('.', 1)[-1].lower() if '.' in file_name else 'py'
+    return code, ext
+
+
+def _unsupported_extension(file_extension):
+    """Return a 400 response if the extension is not one the agent can review."""
+    if file_extension not in SUPPORTED_EXTENSIONS:
+        return jsonify({
+            'status': 'error',
+            'error': f'Unsupported file type: {file_extension}',
+            'analysis_results': {}
+        }), 400
+    return None
+
+
+def _too_many_tokens(code):
+    """Return a 413 response if code would not fit the model's input budget."""
+    n_tokens = count_tokens(code)
+    if n_tokens > config.max_input_tokens:
+        return jsonify({
+            'status': 'error',
+            'error': f'Code is {n_tokens} tokens, above the limit of {config.max_input_tokens}',
+            'analysis_results': {}
+        }), 413
+    return None
+
+@app.errorhandler(400)
+def bad_request(e):
+    return jsonify({
+        'status': 'error',
+        'error': e.description,
+        'analysis_results': {}
+    }), 400
+
+@app.errorhandler(429)
+def rate_limited(e):
+    return jsonify({
+        'status': 'error',
+        'error': f'Rate limit exceeded ({e.description}). Please retry later.',
+        'analysis_results': {}
+    }), 429
+
+@app.errorhandler(413)
+def payload_too_large(e):
+    return jsonify({
+        'status': 'error',
+        'error': f'Request exceeds the maximum size of {config.max_file_size_mb}MB',
+        'analysis_results': {}
+    }), 413
+
 @app.route('/')
 def home():
     return render_template('index.html')
@@ -12,9 +289,11 @@ def health():
     return jsonify({"status": "ok"})
 
 @app.route('/analyze', methods=['POST'])
+@limiter.shared_limit(config.analyze_rate_limit, scope="analyze")
 def analyze_code():
+    _reject_oversize_body()
     try:
-        code = request.form.get('code', '')
+        code, file_extension = _parse_payload()
 
         if not code or not code.strip():
             return jsonify({
@@ -22,20 +301,41 @@ def analyze_code():
                 'error': 'Please provide code to analyze'
             }), 400
 
-        # Import your existing agent here
-        from src.agent import CodeReviewAgent
+        unsupported = _unsupported_extension(file_extension)
+        if unsupported:
+            return unsupported
+
+        too_long = _too_many_tokens(code)
+        if too_long:
+            return too_long
+
+        scope = _cache_scope(file_extension)
+        key = cache_key(code=code, scope=scope)
+        result = review_cache.get(key)
+        _log_cache_lookup(result is not None)
 
-        # Initialize the agent
-        agent = CodeReviewAgent()
+        if result is None and semantic_cache is not None:
+            result = semantic_cache.get(code, scope)
 
-        # Run the analysis (bridge async -> sync)
-        result = asyncio.run(agent.review_code(code, "py"))
+        if result is None:
+            # Run the analysis (bridge async -> sync)
+            result = run_review(code, file_extension)
+            if not isinstance(result, dict):
+                result = {'status': 'success', 'feedback': str(result), 'analysis_results': {}}
+            result = _review_payload(result)
+            _store_review(key, scope, code, result)
 
         # Return the analysis results
-        if not isinstance(result, dict):
-            result = {'status': 'success', 'feedback': str(result), 'analysis_results': {}}
         return jsonify(result), 200
 
+    except HTTPException:
+        raise
+    except FutureTimeoutError:
+        return jsonify({
+            'status': 'error',
+            'error': f'Review timed out after {config.review_timeout} seconds',
+            'analysis_results': {}
+        }), 504
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -43,5 +343,66 @@ def analyze_code():
             'analysis_results': {}
         }), 500
 
+@app.route('/analyze_stream', methods=['POST'])
+@limiter.shared_limit(config.analyze_rate_limit, scope="analyze")
+def analyze_code_stream():
+    _reject_oversize_body()
+    code, file_extension = _parse_payload()
+
+    if not code or not code.strip():
+        return jsonify({
+            'status': 'error',
+            'error': 'Please provide code to analyze'
+        }), 400
+
+    unsupported = _unsupported_extension(file_extension)
+    if unsupported:
+        return unsupported
+
+    too_long = _too_many_tokens(code)
+    if too_long:
+        return too_long
+
+    scope = _cache_scope(file_extension)
+    key = cache_key(code=code, scope=scope)
+    cached = review_cache.get(key)
+    _log_cache_lookup(cached is not None)
+
+    if cached is None and semantic_cache is not None:
+        cached = semantic_cache.get(code, scope)
+
+    def generate():
+        if cached is not None:
+            for category, result in cached.get('analysis_results', {}).items():
+                yield _sse({"event": "analysis", "category": category, **result})
+            yield _sse({"event": "feedback", "feedback": cached.get('feedback', '')})
+        else:
+            analysis_results, feedback, status = {}, None, None
+            for event in stream_review(code, file_extension):
+                if event["event"] == "analysis":
+                    analysis_results[event["category"]] = {
+                        k: v for k, v in event.items() if k not in ("event", "category")
+                    }
+                elif event["event"] == "feedback":
+                    feedback, status = event["feedback"], event.get("status")
+                elif event["event"] == "error":
+                    status = 'error'
+                yield _sse(event)
+
+            if feedback is not None and status:
+                _store_review(key, scope, code, _review_payload({
+                    'status': status,
+                    'analysis_results': analysis_results,
+                    'feedback': feedback
+                }))
+        yield _sse({"event": "done"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    # Local development only; use `gunicorn -c gunicorn_conf.py flask_backend:app` in production
+    app.run(host='0.0.0.0', port=8000, threaded=True)
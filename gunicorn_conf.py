@@ -0,0 +1,45 @@
+"""
+Gunicorn configuration for serving the Flask app.
+
+Reviews spend most of their time waiting on the remote LLM, so each worker
+uses a thread pool (gthread) rather than relying on extra processes.
+"""
+
+import multiprocessing
+import os
+
+from dotenv import dotenv_values
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# The default memory:// rate-limit storage is per process, so every extra worker
+# would multiply each client's limit; use one worker unless limits are shared.
+_rate_limit_storage = (
+    os.environ.get("RATE_LIMIT_STORAGE_URI")
+    or dotenv_values(".env").get("RATE_LIMIT_STORAGE_URI")
+    or "memory://"
+)
+_shared_rate_limits = not _rate_limit_storage.startswith("memory://")
+workers = int(os.environ.get(
+    "WEB_CONCURRENCY",
+    multiprocessing.cpu_count() * 2 + 1 if _shared_rate_limits else 1
+))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# A full review can take minutes; keep this above REVIEW_TIMEOUT
+timeout = 330
+keepalive = 30
+
+# Import the app (LangChain, OpenAI client, ...) once in the master; workers inherit
+# it copy-on-write. Safe because the event loop and agent are created lazily per worker.
+preload_app = True
+
+
+def on_starting(server):
+    if workers > 1 and not _shared_rate_limits:
+        server.log.warning(
+            "%d workers with memory:// rate-limit storage: each worker counts separately, "
+            "so clients get %dx ANALYZE_RATE_LIMIT. Set RATE_LIMIT_STORAGE_URI=redis://...",
+            workers, workers
+        )
@@ -3,15 +3,225 @@ Code Review Agent implementation using LangGraph with parallel analysis nodes.
 """
 
 import asyncio
-import operator
-from typing import Dict, List, Any, Optional, TypedDict
-from typing_extensions import Annotated
+import io
+import json
+import logging
+import re
+import shutil
+import types
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, TypedDict
 
+import httpx
+import orjson
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_openai import ChatOpenAI
+from openai import APIConnectionError, AsyncOpenAI, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 
-from .config import config
+from .config import ENABLED_ANALYSES, config
+from .llm_cache import LLMCache, cache_key
+from .tokens import truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# File extension (lowercase, no dot) -> language name
+_LANGUAGE_MAP = types.MappingProxyType({
+    "py": "python",
+    "js": "javascript",
+    "ts": "typescript",
+    "java": "java",
+    "go": "go"
+})
+SUPPORTED_EXTENSIONS = frozenset(_LANGUAGE_MAP)
+
+# Wrapper tags (<s>, [OUT], ...) and split code fences ("` ``") some models emit
+_LLM_ARTIFACTS_RE = re.compile(r"</?s>|\[/?OUT\]|` {1,2}``")
+
+_SEVERITY_ICONS = {"HIGH": "🔴", "MEDIUM": "🟠", "LOW": "🔵"}
+
+# Bump whenever the analysis or synthesis prompts change so cached reviews are invalidated
+PROMPT_VERSION = "4"
+
+# System prompt templates per analysis type; {language} is filled in per review
+_ANALYSIS_PROMPTS = {
+    "security": """
+You are a security expert reviewing {language} code. Provide a DETAILED security analysis.
+
+For EACH security issue found:
+1. Describe the vulnerability clearly
+2. Explain the potential impact
+3. Show the problematic code snippet
+4. Provide a specific fix with code example
+
+Focus on:
+- Injection vulnerabilities (SQL, command, code injection)
+- Authentication/Authorization issues
+- Data exposure and sensitive information leaks
+- Insecure dependencies or deprecated functions
+- OWASP Top 10 vulnerabilities
+
+If no issues found, return an empty "issues" list with the summary "No security vulnerabilities detected."
+
+Respond ONLY with a JSON object of this shape and nothing else:
+{{"issues": [{{"title": "", "description": "", "severity": "high|medium|low", "code": "", "suggestion": ""}}], "summary": ""}}
+        """,
+    "maintainability": """
+You are a senior software engineer reviewing {language} code. Provide a DETAILED maintainability analysis.
+
+For EACH maintainability issue found:
+1. Identify the code smell or anti-pattern
+2. Explain why it's problematic
+3. Show the problematic code
+4. Suggest a better approach with code example
+
+Focus on:
+- Code smells (long methods, large classes, etc.)
+- Anti-patterns and bad practices
+- High complexity (cyclomatic/cognitive)
+- SOLID principles violations
+- Code duplication
+- Poor error handling (bare except, swallowing exceptions)
+- Unused variables and imports
+
+If no issues found, return an empty "issues" list with the summary "Code maintainability is good."
+
+Respond ONLY with a JSON object of this shape and nothing else:
+{{"issues": [{{"title": "", "description": "", "severity": "high|medium|low", "code": "", "suggestion": ""}}], "summary": ""}}
+        """,
+    "style": """
+You are a code style expert reviewing {language} code. Provide a DETAILED style analysis.
+
+For EACH style issue found:
+1. Point out the style violation
+2. Explain the best practice
+3. Show the problematic code
+4. Provide a corrected version
+
+Focus on:
+- Naming conventions (variables, functions, classes)
+- Code formatting (indentation, spacing, line length)
+- Documentation and comments quality
+- Consistent code style (quotes, imports organization)
+- Language-specific best practices and idioms
+- PEP 8 compliance (for Python)
+
+If no issues found, return an empty "issues" list with the summary "Code style follows best practices."
+
+Respond ONLY with a JSON object of this shape and nothing else:
+{{"issues": [{{"title": "", "description": "", "severity": "high|medium|low", "code": "", "suggestion": ""}}], "summary": ""}}
+        """,
+}
+
+_SYNTHESIS_PROMPT = """
+You are an expert senior software engineer conducting a comprehensive code review.
+
+Synthesize the analysis results below into a DETAILED, well-organized code review.
+
+Structure your review as follows:
+
+## 🔴 Critical Issues (High Priority)
+[List all high-severity issues with detailed explanations and fixes]
+
+## 🟠 Important Issues (Medium Priority)
+[List all medium-severity issues with detailed explanations and fixes]
+
+## 🔵 Minor Issues (Low Priority)
+[List all low-severity issues with suggestions]
+
+## ✅ Positive Aspects
+[Mention any good practices observed]
+
+## 📋 Summary
+[Provide an overall assessment and prioritized action items]
+
+For each issue:
+- Explain WHAT the problem is
+- Explain WHY it's a problem
+- Show the problematic code
+- Provide a SPECIFIC fix with code example
+
+Be detailed, constructive, and actionable. Use code blocks for examples.
+        """
+
+# Analyses this process runs, in configuration order
+_RUN_ANALYSES = tuple(name for name in ENABLED_ANALYSES if name in _ANALYSIS_PROMPTS)
+
+# Resolved once: the ruff executable used for Python style checks, or None if not installed
+_RUFF = shutil.which("ruff")
+
+# Everything besides the code and extension that shapes a review. Cached reviews
+# (including the on-disk semantic cache) are only replayed under the same value.
+SETTINGS_FINGERPRINT = cache_key(
+    prompt_version=PROMPT_VERSION,
+    model=config.openai_model,
+    base_url=config.openai_base_url,
+    analyses={name: config.analyses[name].model_dump() for name in _RUN_ANALYSES},
+    fused=config.fused_analysis,
+    json_mode=config.llm_json_mode,
+    batch=config.batch_mode,
+    ruff=bool(config.ruff_style_analysis and _RUFF),
+    ruff_rules=config.ruff_style_rules,
+    synthesis_tokens=config.max_synthesis_tokens_per_analysis,
+)[:16]
+
+# Focus areas per analysis, used when all analyses are fused into one LLM call
+_FUSED_FOCUS = {
+    "security": "injection (SQL, command, code), authentication/authorization, sensitive data exposure, insecure or deprecated functions, OWASP Top 10",
+    "maintainability": "code smells, anti-patterns, high complexity, SOLID violations, duplication, poor error handling, unused variables and imports",
+    "style": "naming conventions, formatting, documentation quality, consistent style, language idioms (PEP 8 for Python)",
+}
+
+
+# httpx clients (and the ChatOpenAI wrappers holding them) are bound to the event loop
+# that first uses them, so keep one set per loop: the Flask backend's single background
+# loop shares one HTTP/2 pool, and each asyncio.run() gets a fresh one. The clients hold
+# the loop and open sockets, so callers that run short-lived loops must release them
+# with CodeReviewAgent.aclose() (or `async with agent:`) before the loop ends.
+_loop_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_loop_llms: Dict[asyncio.AbstractEventLoop, Dict[str, ChatOpenAI]] = {}
+
+
+def _http_client() -> httpx.AsyncClient:
+    """Async HTTP client for the running loop, so its LLM calls share one HTTP/2 connection pool."""
+    loop = asyncio.get_running_loop()
+    client = _loop_clients.get(loop)
+    if client is None:
+        client = _loop_clients[loop] = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=config.http_max_connections,
+                max_keepalive_connections=config.http_max_keepalive_connections
+            ),
+            timeout=config.llm_request_timeout
+        )
+    return client
+
+
+def _get_llm(model: str) -> ChatOpenAI:
+    """Return the chat model client for model on the running loop."""
+    llms = _loop_llms.setdefault(asyncio.get_running_loop(), {})
+    llm = llms.get(model)
+    if llm is None:
+        llm = llms[model] = ChatOpenAI(
+            model=model,
+            api_key=config.openai_api_key,
+            temperature=0.2,
+            base_url=config.openai_base_url,
+            http_async_client=_http_client(),
+            # Retries are handled by CodeReviewAgent._ainvoke_with_retry
+            max_retries=0
+        )
+    return llm
+
+
+# Transient provider failures (429s, 5xx, dropped connections) are retried with backoff
+_llm_retry = retry(
+    retry=retry_if_exception_type((RateLimitError, APIConnectionError, InternalServerError)),
+    wait=wait_exponential_jitter(initial=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
 
 
 class AnalysisResult(TypedDict):
@@ -26,37 +236,80 @@ class CodeReviewState(TypedDict):
     code: str
     file_extension: str
     language: str
-    # Merge analysis results from parallel nodes by dict union
-    analysis_results: Annotated[Dict[str, AnalysisResult], operator.or_]
+    # Written once by run_analyses (which merges its own parallel results), so no reducer
+    analysis_results: Dict[str, AnalysisResult]
     feedback: str
     error: Optional[str]
+    # Set when the synthesis LLM call failed and feedback is the templated fallback
+    synthesis_error: Optional[str]
     metadata: Dict[str, Any]
 
 
+def review_status(analysis_results: Dict[str, AnalysisResult], synthesis_error: Optional[str] = None) -> str:
+    """Status of a finished review: "partial" when any analysis failed or timed out
+    (its result only carries an error issue) or synthesis fell back to the template,
+    otherwise "success".
+    """
+    failed = synthesis_error is not None or any(
+        "error" in issue
+        for result in analysis_results.values()
+        for issue in result.get("issues", [])
+    )
+    return "partial" if failed else "success"
+
+
 class CodeReviewAgent:
-    """AI-powered code review agent using LangGraph for workflow orchestration."""
+    """AI-powered code review agent using LangGraph for workflow orchestration.
+    
+    LLM clients are created per event loop. A long-lived loop (as in the Flask
+    backend) can keep them; otherwise close them before the loop ends:
+    
+        async with CodeReviewAgent() as agent:
+            result = await agent.review_code(code, "py")
+    """
     
     def __init__(self):
         """Initialize the code review agent with LLM and workflow."""
-        self.llm = ChatOpenAI(
-            model=config.openai_model,
-            api_key=config.openai_api_key,
-            temperature=0.2,
-            base_url=config.openai_base_url
-        )
+        # Completions keyed by model + prompt messages, so identical reviews skip the LLM
+        self._cache = LLMCache(max_entries=config.review_cache_max_entries)
+        # Only {language} varies between analysis prompts, so build every message up front
+        self._system_messages = {
+            (analysis_type, language): SystemMessage(content=template.format(language=language))
+            for analysis_type, template in _ANALYSIS_PROMPTS.items()
+            for language in _LANGUAGE_MAP.values()
+        }
+        self._synthesis_message = SystemMessage(content=_SYNTHESIS_PROMPT)
+        self._analyses = {
+            "security": self._security_analysis,
+            "maintainability": self._maintainability_analysis,
+            "style": self._style_analysis,
+        }
+        # Caps in-flight LLM requests across all reviews sharing this agent, one per event loop
+        self._sems: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
         self.workflow = self._build_workflow()
     
     def _build_workflow(self) -> Any:
         """Build the LangGraph workflow for code review.
         To avoid fan-in merge conflicts, we run analyses in parallel inside a single node.
+        The graph is specialized to the enabled analyses, which are fixed for the process:
+        a single analysis gets its own node, and with none enabled ingest goes straight
+        to synthesis.
         """
         workflow = StateGraph(CodeReviewState)
 
         # Nodes
         workflow.add_node("ingest_code", self._ingest_code)
-        workflow.add_node("run_analyses", self._run_analyses)
         workflow.add_node("synthesize_feedback", self._synthesize_feedback)
         workflow.add_node("handle_error", self._handle_error)
+        
+        if len(_RUN_ANALYSES) > 1:
+            analysis_node = "run_analyses"
+            workflow.add_node(analysis_node, self._run_analyses)
+        elif _RUN_ANALYSES:
+            analysis_node = f"{_RUN_ANALYSES[0]}_analysis"
+            workflow.add_node(analysis_node, self._run_single_analysis)
+        else:
+            analysis_node = None
 
         # Edges
         # Route based on ingest result: if error is set, go to handle_error; else proceed
@@ -68,11 +321,12 @@ class CodeReviewAgent:
             _route_from_ingest,
             {
                 "error": "handle_error",
-                "ok": "run_analyses",
+                "ok": analysis_node or "synthesize_feedback",
             },
         )
 
-        workflow.add_edge("run_analyses", "synthesize_feedback")
+        if analysis_node:
+            workflow.add_edge(analysis_node, "synthesize_feedback")
         workflow.add_edge("handle_error", END)
 
         workflow.set_entry_point("ingest_code")
@@ -80,23 +334,109 @@ class CodeReviewAgent:
 
         return workflow.compile()
     
+    @property
+    def llm(self) -> ChatOpenAI:
+        """Chat model client for the default model on the running loop."""
+        return _get_llm(config.openai_model)
+    
+    @property
+    def _sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            sem = self._sems[loop] = asyncio.Semaphore(config.max_concurrency)
+        return sem
+    
+    async def aclose(self) -> None:
+        """Release the running loop's LLM clients and this agent's semaphore for it.
+        The HTTP client is shared, so this affects every agent on this loop.
+        """
+        loop = asyncio.get_running_loop()
+        self._sems.pop(loop, None)
+        client = _loop_clients.pop(loop, None)
+        _loop_llms.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+    
+    async def __aenter__(self) -> "CodeReviewAgent":
+        return self
+    
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+    
+    @_llm_retry
+    async def _ainvoke_with_retry(self, llm: Any, messages: List[Any]) -> Any:
+        """Invoke llm under the concurrency cap, retrying 429s, 5xx and connection errors."""
+        async with self._sem:
+            return await llm.ainvoke(messages)
+    
+    @_llm_retry
+    async def _open_stream(self, messages: List[Any]) -> Tuple[Any, Any]:
+        """Take a concurrency slot and start streaming, retrying like _ainvoke_with_retry
+        until the first chunk arrives (after that, text has already been forwarded).
+        Returns (stream, first chunk or None); the caller must close the stream and
+        release self._sem.
+        """
+        sem = self._sem
+        await sem.acquire()
+        stream = self.llm.astream(messages)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+        except BaseException:
+            await stream.aclose()
+            sem.release()
+            raise
+    
+    def _llm_cache_key(self, messages: List[Any], json_mode: bool = False, model: Optional[str] = None) -> str:
+        """Cache key for a completion: the model, output mode and every (role, content) message."""
+        return cache_key(
+            model=model or config.openai_model,
+            json_mode=json_mode,
+            messages=[(m.type, m.content) for m in messages]
+        )
+    
+    async def _invoke_llm(
+        self,
+        messages: List[Any],
+        json_mode: bool = False,
+        model: Optional[str] = None
+    ) -> str:
+        """Call the LLM, returning a cached completion for identical prompts.
+        With json_mode the provider is asked to return a JSON object (response_format);
+        model overrides the default model for this call.
+        """
+        key = self._llm_cache_key(messages, json_mode, model)
+        content = self._cache.get(key)
+        if content is None:
+            llm = _get_llm(model) if model else self.llm
+            if json_mode:
+                llm = llm.bind(response_format={"type": "json_object"})
+            response = await self._ainvoke_with_retry(llm, messages)
+            content = getattr(response, "content", "") or ""
+            # An empty reply is a model hiccup, not an answer worth replaying
+            if content.strip():
+                self._cache.set(key, content, ttl=config.review_cache_ttl_seconds)
+        return content
+    
     async def _ingest_code(self, state: CodeReviewState) -> CodeReviewState:
         """Ingest and validate the input code."""
         if not state.get("code"):
-            return {"error": "No code provided", **state}
+            return {"error": "No code provided"}
             
         file_extension = state.get("file_extension", "py").lower()
         language = self._detect_language(file_extension)
         
         if not language:
-            return {"error": f"Unsupported file type: {file_extension}", **state}
+            return {"error": f"Unsupported file type: {file_extension}"}
             
         # Check file size limit (1MB = 1,048,576 bytes)
         max_size_bytes = config.max_file_size_mb * 1024 * 1024
-        if len(state["code"].encode('utf-8')) > max_size_bytes:
+        size_bytes = len(state["code"].encode('utf-8'))
+        if size_bytes > max_size_bytes:
             return {
-                "error": f"File size exceeds the maximum limit of {config.max_file_size_mb}MB",
-                **state
+                "error": f"File size exceeds the maximum limit of {config.max_file_size_mb}MB"
             }
             
         # Return only the keys this node is setting
@@ -106,118 +446,52 @@ class CodeReviewAgent:
             "metadata": {
                 "file_extension": file_extension,
                 "code_length": len(state["code"]),
-                "file_size_mb": len(state["code"].encode('utf-8')) / (1024 * 1024)
+                "file_size_mb": size_bytes / (1024 * 1024)
             }
         }
     
     async def _security_analysis(self, state: CodeReviewState) -> CodeReviewState:
         """Analyze code for security vulnerabilities."""
-        if not config.analyses["security"].enabled:
-            return {}
-
-        system_prompt = f"""
-You are a security expert reviewing {state['language']} code. Provide a DETAILED security analysis.
-
-For EACH security issue found:
-1. Describe the vulnerability clearly
-2. Explain the potential impact
-3. Show the problematic code snippet
-4. Provide a specific fix with code example
-
-Focus on:
-- Injection vulnerabilities (SQL, command, code injection)
-- Authentication/Authorization issues
-- Data exposure and sensitive information leaks
-- Insecure dependencies or deprecated functions
-- OWASP Top 10 vulnerabilities
-
-If no issues found, state "No security vulnerabilities detected."
-
-Provide detailed, actionable feedback with code examples.
-        """
-        
-        return await self._analyze_code(state, "security", system_prompt)
+        return await self._analyze_code(state, "security")
     
     async def _maintainability_analysis(self, state: CodeReviewState) -> CodeReviewState:
         """Analyze code for maintainability issues."""
-        if not config.analyses["maintainability"].enabled:
-            return state
-            
-        system_prompt = f"""
-You are a senior software engineer reviewing {state['language']} code. Provide a DETAILED maintainability analysis.
-
-For EACH maintainability issue found:
-1. Identify the code smell or anti-pattern
-2. Explain why it's problematic
-3. Show the problematic code
-4. Suggest a better approach with code example
-
-Focus on:
-- Code smells (long methods, large classes, etc.)
-- Anti-patterns and bad practices
-- High complexity (cyclomatic/cognitive)
-- SOLID principles violations
-- Code duplication
-- Poor error handling (bare except, swallowing exceptions)
-- Unused variables and imports
-
-If no issues found, state "Code maintainability is good."
-
-Provide detailed, actionable feedback with code examples.
-        """
-        
-        return await self._analyze_code(state, "maintainability", system_prompt)
+        return await self._analyze_code(state, "maintainability")
     
     async def _style_analysis(self, state: CodeReviewState) -> CodeReviewState:
         """Analyze code for style and formatting issues."""
-        if not config.analyses["style"].enabled:
-            return state
-            
-        system_prompt = f"""
-You are a code style expert reviewing {state['language']} code. Provide a DETAILED style analysis.
-
-For EACH style issue found:
-1. Point out the style violation
-2. Explain the best practice
-3. Show the problematic code
-4. Provide a corrected version
-
-Focus on:
-- Naming conventions (variables, functions, classes)
-- Code formatting (indentation, spacing, line length)
-- Documentation and comments quality
-- Consistent code style (quotes, imports organization)
-- Language-specific best practices and idioms
-- PEP 8 compliance (for Python)
-
-If no issues found, state "Code style follows best practices."
-
-Provide detailed, actionable feedback with code examples.
-        """
-        
-        return await self._analyze_code(state, "style", system_prompt)
+        return await self._analyze_code(state, "style")
     
     async def _analyze_code(
         self,
         state: CodeReviewState,
-        analysis_type: str,
-        system_prompt: str
+        analysis_type: str
     ) -> CodeReviewState:
         """Generic method to run code analysis using LLM."""
         try:
             messages = [
-                SystemMessage(content=system_prompt),
+                self._system_messages[(analysis_type, state["language"])],
                 HumanMessage(content=state["code"])
             ]
             
-            response = await self.llm.ainvoke(messages)
+            # Bound the whole call, retries included, so one stuck analysis cannot hold up the review
+            content = await asyncio.wait_for(
+                self._invoke_llm(
+                    messages,
+                    json_mode=config.llm_json_mode,
+                    model=config.analyses[analysis_type].model
+                ),
+                timeout=config.analysis_timeout
+            )
             
             # Parse the response into structured format
-            result = self._parse_analysis_response(response.content, analysis_type)
+            result = self._parse_analysis_response(content, analysis_type)
             
-            # Return only the delta for analysis_results to support parallel merge
+            # Return only the delta for analysis_results; run_analyses merges the parts
             return {"analysis_results": {analysis_type: result}}
             
+        except asyncio.TimeoutError:
+            return {"analysis_results": {analysis_type: self._timeout_result(analysis_type)}}
         except Exception as e:
             # Log error but don't fail the entire analysis
             error_result = AnalysisResult(
@@ -228,15 +502,276 @@ Provide detailed, actionable feedback with code examples.
             
             return {"analysis_results": {analysis_type: error_result}}
     
+    async def _fused_analysis(self, state: CodeReviewState, categories: List[str]) -> CodeReviewState:
+        """Run the given analyses in a single LLM call with a JSON response.
+        Falls back to one call per analysis for every category the response does not
+        answer (unparseable JSON, or a missing or malformed section).
+        """
+        focus = "\n".join(f"- {name}: {_FUSED_FOCUS[name]}" for name in categories)
+        schema = ", ".join(
+            f'"{name}": {{"issues": [{{"title": "", "description": "", "severity": "high|medium|low", "code": "", "suggestion": ""}}], "summary": ""}}'
+            for name in categories
+        )
+        system_prompt = f"""
+You are an expert reviewer analyzing {state['language']} code. Perform each of these analyses:
+{focus}
+
+For EACH issue give a short title, a detailed description of the problem and its impact,
+the problematic code snippet and a specific fix with a code example.
+Use an empty "issues" list for a category with no findings.
+
+Respond ONLY with a JSON object of this shape and nothing else:
+{{{schema}}}
+        """
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.analysis_timeout
+        try:
+            content = await asyncio.wait_for(
+                self._invoke_llm([
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=state["code"])
+                ], json_mode=config.llm_json_mode),
+                timeout=config.analysis_timeout
+            )
+            data = self._parse_json_object(content)
+        except asyncio.TimeoutError:
+            # Retrying per analysis would only wait out the same backend again
+            return {"analysis_results": {name: self._timeout_result(name) for name in categories}}
+        except Exception:
+            # Model could not produce usable structured output
+            data = {}
+        
+        results: Dict[str, AnalysisResult] = {}
+        missing: List[str] = []
+        for name in categories:
+            section = data.get(name)
+            # A flat {"issues": [...]} or {} must not read as "no issues found"
+            if isinstance(section, dict) and isinstance(section.get("issues"), list):
+                results[name] = self._to_analysis_result(section, name)
+            else:
+                missing.append(name)
+        
+        if missing:
+            # The fallback is charged against what is left of the fused call's budget,
+            # so the analysis stage as a whole stays within analysis_timeout
+            tasks = {name: asyncio.ensure_future(self._single_analysis(name, state)) for name in missing}
+            try:
+                done, _ = await asyncio.wait(tasks.values(), timeout=max(deadline - loop.time(), 0))
+            finally:
+                for task in tasks.values():
+                    task.cancel()
+            for name, task in tasks.items():
+                if task in done:
+                    results.update(task.result().get("analysis_results", {}))
+                else:
+                    results[name] = self._timeout_result(name)
+        return {"analysis_results": results}
+
+    async def _batch_analyses(self, state: CodeReviewState) -> CodeReviewState:
+        """Submit every enabled analysis through the OpenAI Batch API and wait for it.
+        Cheaper than real-time calls but can take minutes to hours; meant for offline reviews.
+        """
+        categories = _RUN_ANALYSES
+        client = AsyncOpenAI(api_key=config.openai_api_key, base_url=config.openai_base_url)
+        
+        try:
+            records = [
+                json.dumps({
+                    "custom_id": name,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": config.analyses[name].model or config.openai_model,
+                        "temperature": 0.2,
+                        "messages": [
+                            {"role": "system", "content": self._system_messages[(name, state["language"])].content},
+                            {"role": "user", "content": state["code"]},
+                        ],
+                    },
+                })
+                for name in categories
+            ]
+            batch_file = await client.files.create(
+                file=("analyses.jsonl", "\n".join(records).encode("utf-8")),
+                purpose="batch"
+            )
+            batch = await client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
+            
+            try:
+                delay = config.batch_poll_interval_seconds
+                while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, config.batch_max_poll_interval_seconds)
+                    batch = await client.batches.retrieve(batch.id)
+            except asyncio.CancelledError:
+                # The review was abandoned (e.g. REVIEW_TIMEOUT); stop the batch from running and billing
+                try:
+                    await client.batches.cancel(batch.id)
+                except Exception as e:
+                    logger.warning("Could not cancel batch %s: %s", batch.id, e)
+                raise
+            if batch.status != "completed":
+                raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+            
+            # Successful requests land in the output file, failed ones in the error file
+            lines: List[str] = []
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    lines.extend((await client.files.content(file_id)).text.splitlines())
+            
+            results: Dict[str, AnalysisResult] = {}
+            for line in lines:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                name = record.get("custom_id")
+                if name not in categories:
+                    continue
+                response = record.get("response") or {}
+                if record.get("error") or response.get("status_code") != 200:
+                    error = record.get("error") or (response.get("body") or {}).get("error")
+                    results[name] = self._error_result(
+                        name, str(error or f"HTTP {response.get('status_code')}")
+                    )
+                    continue
+                try:
+                    content = response["body"]["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, TypeError):
+                    results[name] = self._error_result(name, "Malformed batch response")
+                    continue
+                results[name] = self._parse_analysis_response(content, name)
+            
+            for name in categories:
+                if name not in results:
+                    results[name] = self._error_result(name, f"No result in batch {batch.id}")
+            return {"analysis_results": results}
+        except Exception as e:
+            return {"analysis_results": {name: self._error_result(name, str(e)) for name in categories}}
+        finally:
+            await client.close()
+
+    def _error_result(self, analysis_type: str, error: str) -> AnalysisResult:
+        """Result recorded for an analysis whose request failed."""
+        return AnalysisResult(
+            issues=[{"error": error, "severity": "high"}],
+            summary=f"{analysis_type} analysis failed",
+            passed=False
+        )
+
+    def _timeout_result(self, analysis_type: str) -> AnalysisResult:
+        """Error result recorded when an analysis exceeds config.analysis_timeout."""
+        return AnalysisResult(
+            issues=[{"error": f"Timed out after {config.analysis_timeout:g} seconds", "severity": "high"}],
+            summary=f"{analysis_type} analysis timed out",
+            passed=False
+        )
+
+    def _single_analysis(self, analysis_type: str, state: CodeReviewState) -> Any:
+        """Coroutine for one analysis run as its own LLM call."""
+        return self._analyses[analysis_type](state)
+
+    def _use_ruff_for_style(self, state: CodeReviewState) -> bool:
+        """Python style is checked with ruff when it is enabled and installed."""
+        return (
+            config.ruff_style_analysis
+            and state["language"] == "python"
+            and _RUFF is not None
+        )
+
+    async def _ruff_style_analysis(self, state: CodeReviewState) -> CodeReviewState:
+        """Check Python style with ruff instead of the LLM; falls back to the LLM on failure."""
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                # --isolated: ignore any pyproject.toml/ruff.toml in the server's working directory
+                _RUFF, "check", "--isolated", "--output-format=json", "--no-cache",
+                f"--select={config.ruff_style_rules}", "--stdin-filename=snippet.py", "-",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await proc.communicate(state["code"].encode("utf-8"))
+            # ruff exits 1 when it finds violations; anything else is a failure
+            if proc.returncode not in (0, 1):
+                raise RuntimeError(stderr.decode("utf-8", "replace").strip())
+            violations = orjson.loads(stdout or b"[]")
+        except Exception:
+            return await self._style_analysis(state)
+        
+        lines = state["code"].splitlines()
+        issues: List[Dict[str, str]] = []
+        for v in violations[:config.analyses["style"].max_issues]:
+            row = (v.get("location") or {}).get("row") or 0
+            issue = {
+                "title": f"{v.get('code')}: {v.get('message')}",
+                "description": f"Line {row}: {v.get('message')}" + (f" (see {v['url']})" if v.get("url") else ""),
+                "severity": "low",
+            }
+            if 0 < row <= len(lines):
+                issue["code"] = lines[row - 1]
+            if v.get("fix") and v["fix"].get("message"):
+                issue["suggestion"] = v["fix"]["message"]
+            issues.append(issue)
+        
+        return {"analysis_results": {"style": AnalysisResult(
+            issues=issues,
+            summary=f"ruff found {len(violations)} style issue(s)",
+            passed=not violations
+        )}}
+
+    def _to_analysis_result(self, section: Dict[str, Any], analysis_type: str) -> AnalysisResult:
+        """Build an AnalysisResult from a parsed {"issues": [...], "summary": ...} object."""
+        issues = [
+            {k: str(v) for k, v in issue.items() if v}
+            for issue in section.get("issues") or [] if isinstance(issue, dict)
+        ]
+        return AnalysisResult(
+            issues=issues,
+            summary=section.get("summary") or f"{analysis_type} analysis completed",
+            passed=not issues
+        )
+
+    def _parse_json_object(self, content: str) -> Dict[str, Any]:
+        """Extract the JSON object from an LLM response, ignoring code fences or chatter."""
+        start, end = content.find("{"), content.rfind("}")
+        if start == -1 or end < start:
+            raise ValueError("No JSON object in response")
+        data = orjson.loads(content[start:end + 1])
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data
+
+    def _analysis_tasks(self, state: CodeReviewState) -> List[Any]:
+        """Build the coroutines for every enabled analysis."""
+        enabled = list(_RUN_ANALYSES)
+        if config.batch_mode and enabled:
+            return [self._batch_analyses(state)]
+
+        tasks = []
+        if "style" in enabled and self._use_ruff_for_style(state):
+            tasks.append(self._ruff_style_analysis(state))
+            enabled.remove("style")
+        
+        # Analyses routed to a dedicated model cannot share the fused call
+        fusable = [name for name in enabled if not config.analyses[name].model]
+        if config.fused_analysis and len(fusable) > 1:
+            tasks.append(self._fused_analysis(state, fusable))
+            enabled = [name for name in enabled if name not in fusable]
+        
+        tasks.extend(self._single_analysis(name, state) for name in enabled)
+        return tasks
+
+    async def _run_single_analysis(self, state: CodeReviewState) -> CodeReviewState:
+        """Run the only enabled analysis directly, without a gather."""
+        return await self._analysis_tasks(state)[0]
+
     async def _run_analyses(self, state: CodeReviewState) -> CodeReviewState:
         """Run all analyses in parallel and combine their results."""
-        tasks = []
-        if config.analyses["security"].enabled:
-            tasks.append(self._security_analysis(state))
-        if config.analyses["maintainability"].enabled:
-            tasks.append(self._maintainability_analysis(state))
-        if config.analyses["style"].enabled:
-            tasks.append(self._style_analysis(state))
+        tasks = self._analysis_tasks(state)
 
         results = await asyncio.gather(*tasks) if tasks else []
 
@@ -250,101 +785,154 @@ Provide detailed, actionable feedback with code examples.
     async def _synthesize_feedback(self, state: CodeReviewState) -> CodeReviewState:
         """Synthesize all analysis results into a cohesive review."""
         if not state.get("analysis_results"):
-            return {**state, "feedback": "No analysis results to synthesize"}
-            
-        system_prompt = """
-You are an expert senior software engineer conducting a comprehensive code review.
-
-Synthesize the analysis results below into a DETAILED, well-organized code review.
-
-Structure your review as follows:
-
-## 🔴 Critical Issues (High Priority)
-[List all high-severity issues with detailed explanations and fixes]
-
-## 🟠 Important Issues (Medium Priority)
-[List all medium-severity issues with detailed explanations and fixes]
-
-## 🔵 Minor Issues (Low Priority)
-[List all low-severity issues with suggestions]
-
-## ✅ Positive Aspects
-[Mention any good practices observed]
-
-## 📋 Summary
-[Provide an overall assessment and prioritized action items]
-
-For each issue:
-- Explain WHAT the problem is
-- Explain WHY it's a problem
-- Show the problematic code
-- Provide a SPECIFIC fix with code example
-
-Be detailed, constructive, and actionable. Use code blocks for examples.
-        """
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=str(state["analysis_results"]))
-        ]
+            return {"feedback": "No analysis results to synthesize"}
         
-        try:
-            response = await self.llm.ainvoke(messages)
-            content = getattr(response, "content", "") or ""
-            
-            # Clean up LLM response (remove wrapper tags if present)
-            content = self._clean_llm_response(content)
+        # Nothing to prioritize or explain: the templated summary is enough
+        if not self._has_issues(state["analysis_results"]):
+            return {
+                "feedback": self._fallback_synthesis(state["analysis_results"]),
+                "status": "completed"
+            }
             
-            # Debug: check if we got a response
-            if not content or not content.strip():
-                print(f"Warning: LLM returned empty content. Using fallback synthesis.")
-                print(f"Analysis results: {state['analysis_results']}")
-                content = self._fallback_synthesis(state["analysis_results"])
-            else:
-                print(f"Successfully synthesized feedback ({len(content)} chars)")
+        try:
+            content = await asyncio.wait_for(
+                self._invoke_llm(self._synthesis_messages(state["analysis_results"])),
+                timeout=config.synthesis_timeout
+            )
             
             return {
-                "feedback": content,
+                "feedback": self._finalize_feedback(content, state["analysis_results"]),
                 "status": "completed"
             }
         except Exception as e:
-            print(f"Error in synthesize_feedback: {str(e)}")
+            logger.warning("Synthesis failed, using fallback: %s", e)
             return {
                 "feedback": self._fallback_synthesis(state["analysis_results"]),
+                "synthesis_error": str(e) or type(e).__name__,
                 "status": "completed"
             }
 
+    def _has_issues(self, analysis_results: Dict[str, AnalysisResult]) -> bool:
+        """Whether any analysis reported at least one issue (errors count as issues)."""
+        return any(result.get("issues") for result in analysis_results.values())
+
+    def _synthesis_messages(self, analysis_results: Dict[str, AnalysisResult]) -> List[Any]:
+        """Build the prompt messages for the synthesis call."""
+        return [
+            self._synthesis_message,
+            HumanMessage(content=orjson.dumps(self._trim_for_synthesis(analysis_results)).decode())
+        ]
+
+    def _trim_for_synthesis(self, analysis_results: Dict[str, AnalysisResult]) -> Dict[str, Any]:
+        """Copy the results, cutting every issue field (description, code, suggestion,
+        error, ...) so each analysis fits its token budget, in issue order.
+        """
+        trimmed: Dict[str, Any] = {}
+        for category, result in analysis_results.items():
+            budget = config.max_synthesis_tokens_per_analysis
+            issues = []
+            for issue in result.get("issues", []):
+                cut = {}
+                for field, value in issue.items():
+                    # severity is a fixed label the synthesis relies on, not free text
+                    if isinstance(value, str) and value and field != "severity":
+                        value, n_tokens = truncate_tokens(value, max(budget, 0))
+                        budget -= n_tokens
+                    cut[field] = value
+                issues.append(cut)
+            trimmed[category] = {**result, "issues": issues}
+        return trimmed
+
+    async def _stream_synthesis(self, analysis_results: Dict[str, AnalysisResult]) -> AsyncIterator[str]:
+        """Yield synthesis text as the LLM produces it (cached completions come as one chunk).
+        Raises asyncio.TimeoutError once config.synthesis_timeout has passed.
+        """
+        if not analysis_results:
+            return
+        messages = self._synthesis_messages(analysis_results)
+        key = self._llm_cache_key(messages)
+        cached = self._cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        
+        # The stream is read by its own task so the whole call, retries included, can be
+        # bounded and cancelled without waiting on a read across this generator's yields
+        chunks: "asyncio.Queue[Any]" = asyncio.Queue()
+        done = object()
+        
+        async def _produce() -> None:
+            stream, chunk = await self._open_stream(messages)
+            try:
+                while chunk is not None:
+                    if chunk.content:
+                        chunks.put_nowait(chunk.content)
+                    chunk = await anext(stream, None)
+            finally:
+                await stream.aclose()
+                self._sem.release()
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.synthesis_timeout
+        producer = asyncio.ensure_future(_produce())
+        producer.add_done_callback(lambda _: chunks.put_nowait(done))
+        parts: List[str] = []
+        try:
+            while (item := await asyncio.wait_for(chunks.get(), max(deadline - loop.time(), 0))) is not done:
+                parts.append(item)
+                yield item
+            # Surface a failure of the stream itself
+            producer.result()
+        finally:
+            producer.cancel()
+        content = "".join(parts)
+        if content.strip():
+            self._cache.set(key, content, ttl=config.review_cache_ttl_seconds)
+
+    def _finalize_feedback(self, content: str, analysis_results: Dict[str, AnalysisResult]) -> str:
+        """Clean synthesized text, falling back to a templated summary if it is empty."""
+        # Clean up LLM response (remove wrapper tags if present)
+        content = self._clean_llm_response(content)
+        
+        if not content or not content.strip():
+            logger.warning("LLM returned empty content, using fallback synthesis")
+            return self._fallback_synthesis(analysis_results)
+        logger.debug("Synthesized feedback: %d chars", len(content))
+        return content
+
     def _clean_llm_response(self, content: str) -> str:
         """Clean up LLM response by removing wrapper tags and fixing formatting."""
         if not content:
             return ""
         
-        # Remove common wrapper tags
-        content = content.replace("<s>", "").replace("</s>", "")
-        content = content.replace("[OUT]", "").replace("[/OUT]", "")
-        
-        # Fix escaped backticks
-        content = content.replace("` ``", "```")
-        content = content.replace("`  ``", "```")
+        # Remove common wrapper tags and fix escaped backticks in one pass
+        content = _LLM_ARTIFACTS_RE.sub(lambda m: "```" if m.group(0)[0] == "`" else "", content)
         
         return content.strip()
     
     def _fallback_synthesis(self, analysis_results: Dict[str, AnalysisResult]) -> str:
         """Create a detailed human-readable summary from analysis_results.
-        Used when the LLM returns empty content.
+        Used when the LLM returns empty content or no analysis found issues.
         """
         if not analysis_results:
             return "## Code Review Summary\n\nNo analysis results available. Please ensure the code was analyzed properly."
 
-        lines: List[str] = ["# 📋 Code Review Summary\n"]
+        buf = io.StringIO()
+        write = buf.write
+        write("# 📋 Code Review Summary\n")
+        
+        def emit(text: str) -> None:
+            # Sections are newline-separated, as with "\n".join
+            write("\n")
+            write(text)
         
         # Organize by category with proper formatting
         for category, result in analysis_results.items():
-            lines.append(f"\n## {category.title()} Analysis\n")
+            emit(f"\n## {category.title()} Analysis\n")
             
             issues = result.get("issues", []) if isinstance(result, dict) else []
             if not issues:
-                lines.append("✅ **No issues found in this category.**\n")
+                emit("✅ **No issues found in this category.**\n")
                 continue
             
             for i, issue in enumerate(issues, 1):
@@ -352,47 +940,51 @@ Be detailed, constructive, and actionable. Use code blocks for examples.
                 desc = issue.get("description") or issue.get("error") or "No description available"
                 sev = issue.get("severity", "medium").upper()
                 
-                severity_icon = {"HIGH": "🔴", "MEDIUM": "🟠", "LOW": "🔵"}.get(sev, "⚪")
+                severity_icon = _SEVERITY_ICONS.get(sev, "⚪")
                 
                 # Clean up the description (remove wrapper tags and fix backticks)
                 desc = self._clean_llm_response(desc)
                 
-                lines.append(f"\n### {severity_icon} {title} [{sev}]\n")
-                lines.append(f"{desc}\n")
+                emit(f"\n### {severity_icon} {title} [{sev}]\n")
+                emit(f"{desc}\n")
                 
                 if "code" in issue:
-                    lines.append(f"\n**Problematic code:**\n```python\n{issue['code']}\n```\n")
+                    emit(f"\n**Problematic code:**\n```python\n{issue['code']}\n```\n")
                 
                 if "suggestion" in issue:
-                    lines.append(f"\n**Suggested fix:**\n```python\n{issue['suggestion']}\n```\n")
+                    emit(f"\n**Suggested fix:**\n```python\n{issue['suggestion']}\n```\n")
         
-        return "\n".join(lines)
+        return buf.getvalue()
+    
+    def _error_review(self, error: str) -> Dict[str, Any]:
+        """Failed review, with the same keys as one ending in handle_error."""
+        return {
+            "status": "error",
+            "error": error,
+            "feedback": f"Error: {error}",
+            "analysis_results": {}
+        }
     
     async def _handle_error(self, state: CodeReviewState) -> CodeReviewState:
         """Handle errors in the workflow."""
         error_msg = state.get("error", "Unknown error occurred")
         return {
             "feedback": f"Error: {error_msg}",
-            "status": "error"
+            "status": "error",
+            # Ingest stopped before any analysis; keep the {status, error, analysis_results} shape
+            "analysis_results": {}
         }
     
     def _detect_language(self, file_extension: str) -> Optional[str]:
-        """Detect programming language from file extension."""
-        language_map = {
-            "py": "python",
-            "js": "javascript",
-            "ts": "typescript",
-            "java": "java",
-            "go": "go"
-        }
-        return language_map.get(file_extension.lower())
+        """Detect programming language from a lowercase file extension."""
+        return _LANGUAGE_MAP.get(file_extension)
     
     def _parse_analysis_response(
         self,
         response: str,
         analysis_type: str
     ) -> AnalysisResult:
-        """Parse LLM response into structured format."""
+        """Parse the LLM's JSON response into an AnalysisResult, or wrap free text as one issue."""
         if not response or not response.strip():
             return AnalysisResult(
                 issues=[],
@@ -400,8 +992,15 @@ Be detailed, constructive, and actionable. Use code blocks for examples.
                 passed=True
             )
         
-        # Parse the response into structured issues
-        # For now, treat the entire response as a single detailed finding
+        try:
+            data = self._parse_json_object(response)
+            # Braces in a prose answer (e.g. a code example) are not our schema
+            if "issues" in data:
+                return self._to_analysis_result(data, analysis_type)
+        except ValueError:
+            pass
+        
+        # Not JSON: treat the entire response as a single detailed finding
         return AnalysisResult(
             issues=[{
                 "title": f"{analysis_type.title()} Analysis",
@@ -427,24 +1026,98 @@ Be detailed, constructive, and actionable. Use code blocks for examples.
         Returns:
             Dict containing the review results
         """
-        initial_state = CodeReviewState(
+        # Reject obviously invalid input without going through the graph;
+        # _ingest_code still validates (including size) inside the workflow
+        if not code:
+            return self._error_review("No code provided")
+        if file_extension.lower() not in _LANGUAGE_MAP:
+            return self._error_review(f"Unsupported file type: {file_extension}")
+        
+        # Only the inputs: every other key is written by the nodes themselves,
+        # so there is nothing to gain from pre-filling placeholders
+        try:
+            result = await self.workflow.ainvoke(
+                {"code": code, "file_extension": file_extension}
+            )
+            status = "error" if result.get("error") else review_status(
+                result.get("analysis_results") or {}, result.get("synthesis_error")
+            )
+            return {
+                "status": status,
+                **result
+            }
+        except Exception as e:
+            return self._error_review(str(e))
+
+    async def review_code_stream(
+        self,
+        code: str,
+        file_extension: str = "py"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Review the provided code, yielding events as each stage finishes.
+        
+        Yields dicts with an ``event`` key:
+            - ``analysis``: one per category, as soon as that analysis completes
+            - ``feedback_delta``: raw synthesis text as the LLM streams it
+            - ``feedback``: the final, cleaned synthesized review, with the review ``status``
+            - ``error``: validation or runtime failure (terminates the stream)
+        """
+        state = CodeReviewState(
             code=code,
             file_extension=file_extension,
             language="",
             analysis_results={},
             feedback="",
             error=None,
+            synthesis_error=None,
             metadata={}
         )
         
         try:
-            result = await self.workflow.ainvoke(initial_state)
-            return {
-                "status": "success",
-                **result
+            ingest = await self._ingest_code(state)
+            if ingest.get("error"):
+                yield {"event": "error", "error": ingest["error"]}
+                return
+            state.update(ingest)
+            
+            # Own the tasks so they can be cancelled if the consumer stops early
+            tasks = [asyncio.ensure_future(coro) for coro in self._analysis_tasks(state)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    part = await next_done
+                    for category, result in part.get("analysis_results", {}).items():
+                        state["analysis_results"][category] = result
+                        yield {"event": "analysis", "category": category, **result}
+            finally:
+                # A no-op once they are all done; stops in-flight LLM calls on
+                # client disconnect, REVIEW_TIMEOUT or an error
+                for task in tasks:
+                    task.cancel()
+            
+            if not self._has_issues(state["analysis_results"]):
+                yield {
+                    "event": "feedback",
+                    "feedback": self._fallback_synthesis(state["analysis_results"]),
+                    "status": review_status(state["analysis_results"])
+                }
+                return
+            
+            # Forward synthesis tokens as they arrive; the final event carries the cleaned text
+            parts: List[str] = []
+            try:
+                async for delta in self._stream_synthesis(state["analysis_results"]):
+                    parts.append(delta)
+                    yield {"event": "feedback_delta", "delta": delta}
+            except Exception as e:
+                logger.warning("Synthesis failed, using fallback: %s", e)
+                state["synthesis_error"] = str(e) or type(e).__name__
+                parts = []
+            feedback = self._finalize_feedback("".join(parts), state["analysis_results"])
+            yield {
+                "event": "feedback",
+                "feedback": feedback,
+                "status": review_status(state["analysis_results"], state["synthesis_error"])
             }
         except Exception as e:
-            return {
-                "status": "error",
-                "error": str(e)
-            }
+            yield {"event": "error", "error": str(e)}
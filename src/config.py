@@ -14,6 +14,8 @@ class AnalysisConfig(BaseModel):
     enabled: bool = True
     severity: str = "medium"
     max_issues: int = 10
+    # Model id for this analysis; None uses Settings.openai_model
+    model: Optional[str] = None
 
     @field_validator('severity')
     def validate_severity(cls, v):
@@ -36,14 +38,48 @@ class Settings(BaseSettings):
     openrouter_api_key: str | None = Field(None, description="OpenRouter API key (alternative)")
     openai_model: str = Field("mistralai/mistral-7b-instruct", description="Model ID (OpenRouter model id by default)")
     openai_base_url: str = Field("https://openrouter.ai/api/v1", description="Base URL for OpenAI-compatible API (OpenRouter by default)")
+    llm_request_timeout: float = Field(120.0, description="Timeout in seconds for a single LLM HTTP request (one attempt; retries get their own); at most analysis_timeout and synthesis_timeout")
+    http_max_connections: int = Field(64, description="Maximum open connections in the shared LLM HTTP pool")
+    http_max_keepalive_connections: int = Field(32, description="Maximum idle keep-alive connections kept in the pool")
+    max_concurrency: int = Field(8, description="Maximum concurrent LLM requests per agent")
     
     # Application Settings
     max_file_size_mb: int = Field(10, description="Maximum file size in MB")
+    log_level: str = Field("INFO", description="Logging level for the web app (DEBUG, INFO, WARNING, ...)")
+    review_timeout: int = Field(300, description="Seconds a web request waits for a review to finish; split between the analysis and synthesis stages")
+    analysis_timeout: Optional[float] = Field(
+        None,
+        description=(
+            "Seconds the analysis stage may take (all LLM attempts, retry waits and the per-analysis "
+            "fallback of a fused call) before an analysis is recorded as timed out. Defaults to half of review_timeout"
+        )
+    )
+    synthesis_timeout: Optional[float] = Field(
+        None,
+        description=(
+            "Seconds the synthesis call may take (all attempts and retry waits) before the templated "
+            "summary is used instead. Defaults to 40% of review_timeout; analysis_timeout + "
+            "synthesis_timeout must stay below review_timeout"
+        )
+    )
+    max_input_tokens: int = Field(24000, description="Maximum tokens of code sent to the model in one review")
+    max_synthesis_tokens_per_analysis: int = Field(2000, description="Token budget for each analysis' issue descriptions in the synthesis prompt")
+    analyze_rate_limit: str = Field("10/minute;100/hour", description="Per-client rate limit for the analyze endpoints")
+    rate_limit_storage_uri: str = Field("memory://", description="Flask-Limiter storage backend, e.g. redis://localhost:6379; memory:// is per process")
+    trusted_proxy_count: int = Field(0, description="Reverse proxies in front of the app whose X-Forwarded-For/-Proto headers are trusted (0 = none)")
     supported_languages: List[str] = Field(
         default_factory=lambda: ["python", "javascript", "typescript", "java", "go"],
         description="List of supported programming languages"
     )
     
+    # Review Cache Configuration
+    review_cache_ttl_seconds: int = Field(604800, description="How long cached reviews stay valid, in seconds")
+    review_cache_max_entries: int = Field(1024, description="Maximum number of cached reviews kept in memory")
+    semantic_cache_enabled: bool = Field(False, description="Reuse reviews of near-duplicate code (needs sentence-transformers and faiss-cpu)")
+    semantic_threshold: float = Field(0.92, description="Minimum cosine similarity for a semantic cache hit")
+    semantic_cache_dir: str = Field(".semantic_cache", description="Directory where semantic cache entries are persisted, one file each")
+    semantic_cache_max_entries: int = Field(1000, description="Maximum semantic cache entries; the oldest are evicted first")
+    
     # Analysis Configuration
     analyses: Dict[str, AnalysisConfig] = Field(
         default_factory=lambda: {
@@ -66,6 +102,14 @@ class Settings(BaseSettings):
         description="Configuration for different analysis types"
     )
     
+    fused_analysis: bool = Field(True, description="Run all enabled analyses in a single LLM call with JSON output")
+    ruff_style_analysis: bool = Field(True, description="Check Python style with ruff instead of the LLM when ruff is installed")
+    ruff_style_rules: str = Field("E,W,N,I,Q,UP", description="Comma-separated ruff rule selectors used for the style analysis")
+    llm_json_mode: bool = Field(False, description="Request response_format=json_object for structured calls (model must support it)")
+    batch_mode: bool = Field(False, description="Submit analyses via the OpenAI Batch API (cheaper, slow; for offline reviews)")
+    batch_poll_interval_seconds: int = Field(10, description="Initial delay between Batch API status checks")
+    batch_max_poll_interval_seconds: int = Field(300, description="Upper bound for the exponential Batch API polling delay")
+    
     # GitHub Integration (optional)
     github_token: Optional[str] = Field(None, description="GitHub API token")
     
@@ -77,8 +121,22 @@ class Settings(BaseSettings):
             object.__setattr__(self, 'openai_api_key', self.openrouter_api_key)
         if not self.openai_api_key:
             raise ValueError("API key is required. Set OPENAI_API_KEY or OPENROUTER_API_KEY in .env")
+        # Stage budgets come out of review_timeout, so a web request gets the finished
+        # analyses back (possibly partial) instead of a 504
+        if self.analysis_timeout is None:
+            object.__setattr__(self, 'analysis_timeout', self.review_timeout * 0.5)
+        if self.synthesis_timeout is None:
+            object.__setattr__(self, 'synthesis_timeout', self.review_timeout * 0.4)
+        if self.analysis_timeout + self.synthesis_timeout >= self.review_timeout:
+            raise ValueError("analysis_timeout + synthesis_timeout must be below review_timeout")
+        # A stage shorter than one HTTP attempt would preempt the HTTP timeout and hide its error
+        if self.llm_request_timeout > min(self.analysis_timeout, self.synthesis_timeout):
+            raise ValueError("llm_request_timeout must not exceed analysis_timeout or synthesis_timeout")
         return self
 
 
 # Create a single instance of settings to be imported
 config = Settings()
+
+# Settings are fixed for the process lifetime; resolve the enabled analyses once
+ENABLED_ANALYSES = tuple(name for name, analysis in config.analyses.items() if analysis.enabled)
@@ -0,0 +1,139 @@
+"""
+Embedding-similarity cache for reviews of near-duplicate code.
+
+Requires the optional `sentence-transformers` and `faiss-cpu` packages; when
+they are missing the cache stays disabled and every lookup is a miss.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .llm_cache import cache_key
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+
+class SemanticCache:
+    """Nearest-neighbour cache of (code embedding, review result) pairs.
+
+    Every entry is its own JSON file (embedding, scope and result), written
+    atomically, so several Gunicorn workers can share cache_dir without
+    overwriting each other. The faiss index is rebuilt in memory from those
+    files, so it can never disagree with the entries.
+    """
+
+    def __init__(self, cache_dir: str, threshold: float = 0.92, max_entries: int = 1000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.enabled = False
+        self._dir = Path(cache_dir)
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+
+        try:
+            import faiss
+            import numpy as np
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            return
+
+        self._faiss = faiss
+        self._np = np
+        self._model = SentenceTransformer(EMBEDDING_MODEL)
+        self._dim = self._model.get_sentence_embedding_dimension()
+        self._entries = self._load_entries()
+        self._rebuild_index()
+        self.enabled = True
+
+    def _embed(self, code: str):
+        return self._model.encode([code], normalize_embeddings=True).astype("float32")
+
+    def _fits(self, code: str) -> bool:
+        """Whether the model embeds all of code. Longer input is silently cut to its
+        first max_seq_length word-pieces, so two files sharing that prefix would look
+        identical and an edit further down would get the old file's review back.
+        """
+        n_tokens = len(self._model.tokenizer(code, add_special_tokens=True, verbose=False)["input_ids"])
+        return n_tokens <= self._model.max_seq_length
+
+    def _load_entries(self) -> List[Dict[str, Any]]:
+        """Read the newest max_entries entry files, oldest first."""
+        entries = []
+        for path in self._dir.glob("*.json"):
+            try:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+                mtime = path.stat().st_mtime
+            except (OSError, ValueError):
+                # Removed by another worker meanwhile, or not readable
+                continue
+            if isinstance(entry, dict) and len(entry.get("embedding") or ()) == self._dim:
+                entries.append((mtime, entry))
+        entries.sort(key=lambda item: item[0])
+        return [entry for _, entry in entries[-self.max_entries:]]
+
+    def _rebuild_index(self) -> None:
+        # Inner product over normalized vectors == cosine similarity
+        self._index = self._faiss.IndexFlatIP(self._dim)
+        if self._entries:
+            self._index.add(self._np.asarray([e["embedding"] for e in self._entries], dtype="float32"))
+
+    def _write_entry(self, entry: Dict[str, Any]) -> None:
+        """Write entry to its own file via a temp file + os.replace, so readers never see a partial file."""
+        self._dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self._dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._dir / f"{entry['key']}.json")
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def get(self, code: str, scope: str) -> Optional[Any]:
+        """Return the closest cached result within scope if it clears the threshold."""
+        if not self.enabled or not self._fits(code):
+            return None
+        emb = self._embed(code)
+        with self._lock:
+            if self._index.ntotal == 0:
+                return None
+            scores, ids = self._index.search(emb, 1)
+            score, idx = float(scores[0, 0]), int(ids[0, 0])
+            if idx < 0 or score < self.threshold:
+                return None
+            entry = self._entries[idx]
+            if entry["scope"] != scope:
+                return None
+            return entry["result"]
+
+    def put(self, code: str, scope: str, result: Any) -> None:
+        """Add a review result, persist it, and evict the oldest entries beyond max_entries.
+        Code too long to embed whole is not stored.
+        """
+        if not self.enabled or not self._fits(code):
+            return
+        emb = self._embed(code)
+        entry = {
+            "key": cache_key(code=code, scope=scope),
+            "scope": scope,
+            "embedding": emb[0].tolist(),
+            "result": result,
+        }
+        self._write_entry(entry)
+
+        with self._lock:
+            kept = [e for e in self._entries if e["key"] != entry["key"]]
+            replaced = len(kept) != len(self._entries)
+            kept.append(entry)
+            evicted, self._entries = kept[:-self.max_entries], kept[-self.max_entries:]
+            if replaced or evicted:
+                self._rebuild_index()
+            else:
+                self._index.add(emb)
+
+        for old in evicted:
+            (self._dir / f"{old['key']}.json").unlink(missing_ok=True)
@@ -0,0 +1,55 @@
+"""
+Token counting helpers for sizing LLM inputs.
+"""
+
+from functools import lru_cache
+from typing import Any, Optional, Tuple
+
+from .config import config
+
+# Rough characters-per-token ratio used when no tokenizer is available
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str) -> Optional[Any]:
+    """Load the tiktoken encoding for model, falling back to cl100k_base."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # OpenRouter ids (e.g. mistralai/...) are unknown to tiktoken
+        pass
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoding files could not be downloaded (offline)
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Count the tokens in text for model (defaults to the configured model)."""
+    enc = _encoding(model or config.openai_model)
+    if enc is None:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> Tuple[str, int]:
+    """Cut text down to at most max_tokens tokens, marking the cut.
+    Returns the text and its token count (excluding the marker), so callers
+    tracking a budget need not tokenize it again.
+    """
+    enc = _encoding(model or config.openai_model)
+    if enc is None:
+        max_chars = max_tokens * _CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text, len(text) // _CHARS_PER_TOKEN + 1
+        return text[:max_chars] + " …[truncated]", max_tokens
+    tokens = enc.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    return enc.decode(tokens[:max_tokens]) + " …[truncated]", max_tokens
@@ -15,27 +15,36 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // Show loading state
+        resetCategories();
         showResults();
         showTab('security');
 
         try {
             const formData = new FormData(form);
 
-            const response = await fetch('/analyze', {
+            const response = await fetch('/analyze_stream', {
                 method: 'POST',
                 body: formData
             });
 
-            const data = await response.json();
-
-            if (data.status === 'error') {
+            if (!response.ok) {
+                const data = await response.json();
                 showError(data.error);
                 hideResults();
                 return;
             }
 
-            // Display the results
-            displayResults(data);
+            // Render each analysis as soon as the server streams it
+            await readEventStream(response, function(event) {
+                if (event.event === 'analysis') {
+                    displayCategoryIssues(event.category, event);
+                } else if (event.event === 'error') {
+                    showError(event.error);
+                    hideResults();
+                } else if (event.event === 'done') {
+                    finishPendingCategories();
+                }
+            });
 
         } catch (error) {
             showError('Network error: ' + error.message);
@@ -44,6 +53,44 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+
+        messages.forEach(message => {
+            if (message.startsWith('data: ')) {
+                onEvent(JSON.parse(message.slice(6)));
+            }
+        });
+    }
+}
+
+const CATEGORIES = ['security', 'maintainability', 'style'];
+
+function resetCategories() {
+    CATEGORIES.forEach(category => {
+        document.getElementById(category).innerHTML = `<div class="loading">🔄 Analyzing ${category}...</div>`;
+    });
+}
+
+function finishPendingCategories() {
+    // Categories that never reported (e.g. disabled analyses) still show a spinner
+    CATEGORIES.forEach(category => {
+        if (document.querySelector(`#${category} .loading`)) {
+            displayCategoryIssues(category, null);
+        }
+    });
+}
+
 function showResults() {
     document.getElementById('results').style.display = 'block';
     document.getElementById('error').style.display = 'none';
@@ -118,17 +165,13 @@ function displayCategoryIssues(category, categoryData) {
     });
 }
 
+const LLM_ARTIFACTS_RE = /<\/?s>|\[\/?OUT\]|` {1,2}``/g;
+
 function cleanDescription(description) {
     if (!description) return '';
 
-    // Remove LLM formatting tags
-    let cleaned = description
-        .replace(/<s>/g, '')
-        .replace(/<\/s>/g, '')
-        .replace(/\[OUT\]/g, '')
-        .replace(/\[\/OUT\]/g, '')
-        .replace(/` ``/g, '```')
-        .replace(/`  ``/g, '```');
+    // Remove LLM formatting tags and repair split backtick fences in one pass
+    let cleaned = description.replace(LLM_ARTIFACTS_RE, match => match[0] === '`' ? '```' : '');
 
     // Convert markdown-like formatting to HTML
     cleaned = cleaned.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');